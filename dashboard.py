@@ -3,11 +3,14 @@
 import streamlit as st
 import pandas as pd
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import hashlib
+import threading
+from contextlib import contextmanager
 import folium
-import geopandas as gpd
 from streamlit_folium import st_folium
 import plotly.express as px
-import json
 
 # --- Page Config (UI ENHANCEMENT: Set early for better loading experience) ---
 st.set_page_config(page_title="Crime Analytics Dashboard", page_icon="🗺️", layout="wide")
@@ -18,6 +21,7 @@ DB_USER = "postgres"
 DB_PASS = st.secrets["db_password"] # UI ENHANCEMENT: Load password from secrets for deployment
 DB_HOST = "localhost"
 DB_PORT = "5432"
+POOL_SIZE = 8
 
 # Define geographic regions for filtering
 REGIONS = {
@@ -30,19 +34,67 @@ REGIONS = {
 }
 
 # --- Database Connection & Caching ---
+class PreparingConnection(psycopg2.extensions.connection):
+    # Remembers which statements this session has already PREPAREd (see `prepare` below).
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
 @st.cache_resource
-def get_connection():
+def get_pool():
     # UI ENHANCEMENT: Added robust error handling for connection
+    # A pool lets concurrent reruns query in parallel backends instead of queueing on a single shared connection.
     try:
-        return psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT)
+        pool = psycopg2.pool.ThreadedConnectionPool(
+            1, POOL_SIZE, dbname=DB_NAME, user=DB_USER, password=DB_PASS, host=DB_HOST, port=DB_PORT,
+            connection_factory=PreparingConnection,
+            # Label the sessions in pg_stat_activity and cancel runaway queries before they stall the UI.
+            application_name="crime_dashboard", options="-c statement_timeout=10s"
+        )
+        # getconn() raises instead of waiting once every connection is out, so callers take a slot first
+        # and queue for a free connection, the way they used to on the single shared one.
+        return pool, threading.BoundedSemaphore(POOL_SIZE)
     except psycopg2.OperationalError as e:
         st.error(f"🚨 Database Connection Error: Could not connect to the database. Please check your credentials and ensure the database is running. Details: {e}")
         st.stop()
-conn = get_connection()
+pool, pool_slots = get_pool()
+
+@contextmanager
+def pooled_connection():
+    with pool_slots:
+        conn = pool.getconn()
+        try:
+            # The dashboard only reads, so don't leave the session idling inside an open transaction.
+            conn.autocommit = True
+            yield conn
+        finally:
+            # Broken connections are discarded rather than handed to the next query.
+            pool.putconn(conn, close=bool(conn.closed))
+
+def prepare(conn, query, params):
+    # PREPAREs a %s-parameterised query once per session and returns the matching EXECUTE,
+    # so Postgres reuses the plan on every rerun instead of parsing and planning each filter combination again.
+    name = "dash_" + hashlib.md5(query.encode()).hexdigest()
+    if name not in conn.prepared:
+        # Swap each %s for $1..$n directly; %-formatting would trip over any literal % in the SQL.
+        parts = query.split("%s")
+        assert len(parts) - 1 == len(params), f"query has {len(parts) - 1} placeholders for {len(params)} params"
+        statement = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+        with conn.cursor() as cur:
+            cur.execute(f"PREPARE {name} AS {statement}")
+        conn.prepared.add(name)
+    if not params:
+        return f"EXECUTE {name};", None
+    # Tuples keep the cache keys hashable; psycopg2 only binds lists as Postgres arrays.
+    args = [list(p) if isinstance(p, tuple) else p for p in params]
+    return f"EXECUTE {name} ({', '.join(['%s'] * len(args))});", args
 
 @st.cache_data(ttl=600)
-def load_data(query):
-    return pd.read_sql_query(query, conn)
+def load_tabular(query, params=()):
+    # Small result frames only: st.cache_data hashes and pickles every hit.
+    with pooled_connection() as conn:
+        sql, args = prepare(conn, query, params)
+        return pd.read_sql_query(sql, conn, params=args)
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -53,7 +105,7 @@ with st.sidebar:
     st.markdown("---")
     
     try:
-        all_crime_types_options = load_data('SELECT DISTINCT crime_type FROM crimes ORDER BY crime_type;')['crime_type'].tolist()
+        all_crime_types_options = load_tabular('SELECT DISTINCT crime_type FROM crimes ORDER BY crime_type;')['crime_type'].tolist()
         selected_crime_types = st.multiselect("Filter Map by Crime Type", options=all_crime_types_options, default=[])
     except Exception as e:
         st.error(f"Could not load crime types: {e}")
@@ -65,32 +117,80 @@ map_center = [(region_box[1] + region_box[3]) / 2, (region_box[0] + region_box[2
 map_zoom = 5 if selected_region_name == "All India" else 6
 
 # --- Build Dynamic SQL WHERE Clause ---
-sql_zone_region_filter = ""
-if selected_region_name != "All India":
-    sql_zone_region_filter = f"AND ST_Intersects(z.boundary, ST_MakeEnvelope({region_box[0]}, {region_box[1]}, {region_box[2]}, {region_box[3]}, 4326))"
+# A tuple hashes cheaply and lets the selection key the cached loaders below.
+selected_crime_types = tuple(selected_crime_types)
 
-sql_crime_type_filter = ""
-if selected_crime_types:
-    crime_filter_str = "','".join(selected_crime_types)
-    sql_crime_type_filter = f"AND c.crime_type IN ('{crime_filter_str}')"
+def build_zone_filters(region_name, crime_types):
+    region_filter, params = "", ()
+    if region_name != "All India":
+        # Regions are coarse rectangles, so a bounding-box overlap (&&) is enough and is answered straight from the GIST index.
+        region_filter = "AND z.boundary && ST_MakeEnvelope(%s, %s, %s, %s, 4326)"
+        params += tuple(REGIONS[region_name]['box'])
+
+    crime_filter = ""
+    if crime_types:
+        crime_filter = "AND zcc.crime_type = ANY(%s)"
+        params += (crime_types,)
+    return region_filter, crime_filter, params
 
 # --- MAIN DASHBOARD ---
 st.title(f"🗺️ Regional Crime Analysis: {selected_region_name}")
 
 # --- Data Loading with Spinner ---
-@st.cache_data(ttl=600)
-def get_choropleth_data(region_filter, crime_filter):
+# Per-district counts come from the zone_crime_counts roll-up refreshed by data_generator_real_zones.py.
+@st.cache_resource(ttl=600)
+def load_geo(region_name, crime_types):
+    # PostGIS assembles the whole FeatureCollection, so the map layer is one string instead of one JSON blob per row.
+    # It draws the pre-simplified outlines stored by load_real_zones.py rather than the full-resolution boundaries.
+    # st.cache_resource hands back that same immutable string on every hit instead of hashing and copying it.
+    region_filter, crime_filter, params = build_zone_filters(region_name, crime_types)
     query = f"""
-        SELECT
-            z.name AS "District", ST_AsGeoJSON(z.boundary) as boundary, COUNT(c.crime_id) AS "Crime Count"
-        FROM zones z JOIN crimes c ON z.zone_id = c.zone_id
+        SELECT jsonb_build_object(
+            'type', 'FeatureCollection',
+            'features', COALESCE(jsonb_agg(jsonb_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(z.boundary_simplified)::jsonb,
+                'properties', jsonb_build_object('District', z.name, 'Crime Count', z.cnt)
+            )), '[]'::jsonb)
+        )::text
+        FROM (
+            SELECT z.zone_id, z.name, z.boundary_simplified, SUM(zcc.cnt) AS cnt
+            FROM zones z JOIN zone_crime_counts zcc ON z.zone_id = zcc.zone_id
+            WHERE 1=1 {region_filter} {crime_filter}
+            GROUP BY z.zone_id, z.name, z.boundary_simplified
+        ) z;
+    """
+    with pooled_connection() as conn:
+        sql, args = prepare(conn, query, params)
+        with conn.cursor() as cur:
+            cur.execute(sql, args)
+            return cur.fetchone()[0]
+
+def get_district_counts(region_name, crime_types):
+    region_filter, crime_filter, params = build_zone_filters(region_name, crime_types)
+    query = f"""
+        SELECT z.name AS "District", SUM(zcc.cnt)::bigint AS "Crime Count"
+        FROM zones z JOIN zone_crime_counts zcc ON z.zone_id = zcc.zone_id
+        WHERE 1=1 {region_filter} {crime_filter}
+        GROUP BY z.zone_id, z.name;
+    """
+    return load_tabular(query, params)
+
+def get_top_hotspots(region_name, crime_types):
+    # LIMIT lets Postgres keep a bounded top-N heap instead of sorting every district.
+    region_filter, crime_filter, params = build_zone_filters(region_name, crime_types)
+    query = f"""
+        SELECT z.name AS "District", SUM(zcc.cnt)::bigint AS "Crime Count"
+        FROM zones z JOIN zone_crime_counts zcc ON z.zone_id = zcc.zone_id
         WHERE 1=1 {region_filter} {crime_filter}
-        GROUP BY z.zone_id, z.name, z.boundary ORDER BY "Crime Count" DESC;
+        GROUP BY z.zone_id, z.name ORDER BY "Crime Count" DESC LIMIT 10;
     """
-    return load_data(query)
+    return load_tabular(query, params)
 
 with st.spinner('Crunching the numbers and drawing the map...'):
-    choropleth_df = get_choropleth_data(sql_zone_region_filter, sql_crime_type_filter)
+    choropleth_geojson = load_geo(selected_region_name, selected_crime_types)
+    choropleth_df = get_district_counts(selected_region_name, selected_crime_types)
+    top_zones_df = get_top_hotspots(selected_region_name, selected_crime_types)
 
 col1, col2 = st.columns([2, 1])
 
@@ -98,11 +198,8 @@ with col1:
     st.subheader("📍 Crime Hotspots by District")
     m = folium.Map(location=map_center, zoom_start=map_zoom, tiles="CartoDB positron", scrollWheelZoom=False)
     if not choropleth_df.empty:
-        features = [{"type": "Feature", "geometry": json.loads(row["boundary"]), "properties": {"District": row["District"], "Crime Count": row["Crime Count"]}} for _, row in choropleth_df.iterrows()]
-        gdf = gpd.GeoDataFrame.from_features(features, crs="EPSG:4326")
-        
         choropleth = folium.Choropleth(
-            geo_data=gdf, name='Crime Rate', data=gdf, columns=['District', 'Crime Count'],
+            geo_data=choropleth_geojson, name='Crime Rate', data=choropleth_df, columns=['District', 'Crime Count'],
             key_on='feature.properties.District', fill_color='YlOrRd', fill_opacity=0.8,
             line_opacity=0.2, legend_name='Total Reported Crimes by District'
         ).add_to(m)
@@ -121,14 +218,13 @@ with col1:
 with col2:
     st.subheader("🏆 Top 10 Crime Hotspots")
     st.markdown(f"Highest crime districts within **{selected_region_name}**.")
-    if not choropleth_df.empty:
+    if not top_zones_df.empty:
         # UI ENHANCEMENT: Use st.metric for the #1 hotspot
-        top_district_name = choropleth_df['District'].iloc[0].split(',')[0]
-        top_district_count = choropleth_df['Crime Count'].iloc[0]
+        top_district_name = top_zones_df['District'].iloc[0].split(',')[0]
+        top_district_count = top_zones_df['Crime Count'].iloc[0]
         st.metric(label=f"🥇 #1 Hotspot: {top_district_name}", value=f"{top_district_count:,} Reports")
         
         # Display the rest of the list
-        top_zones_df = choropleth_df[['District', 'Crime Count']].head(10).reset_index(drop=True)
         st.dataframe(top_zones_df, use_container_width=True, hide_index=True)
     else:
         st.warning("No crime data available for this region or filter.")
@@ -137,16 +233,28 @@ with col2:
 st.markdown("---")
 st.subheader(f"📊 Statistical Breakdown for {selected_region_name}")
 
-sql_point_region_filter = ""
+sql_point_region_filter, point_region_params = "", ()
 if selected_region_name != "All India":
-    sql_point_region_filter = f"AND ST_Contains(ST_MakeEnvelope({region_box[0]}, {region_box[1]}, {region_box[2]}, {region_box[3]}, 4326), location)"
+    sql_point_region_filter = "AND location && ST_MakeEnvelope(%s, %s, %s, %s, 4326)"
+    point_region_params = tuple(region_box)
+
+# Both charts come from one round-trip and a single filtered scan of crimes; `kind` tells their rows apart.
+breakdown_query = f"""
+    WITH filtered AS (
+        SELECT crime_type, hour_of_day FROM crimes WHERE location IS NOT NULL {sql_point_region_filter}
+    )
+    SELECT 'dist' AS kind, crime_type, NULL::int AS hour, COUNT(*) AS count FROM filtered GROUP BY crime_type
+    UNION ALL
+    SELECT 'hourly', NULL, hour_of_day, COUNT(*) FROM filtered GROUP BY hour_of_day;
+"""
+breakdown_df = load_tabular(breakdown_query, point_region_params)
+crime_dist_df = breakdown_df.loc[breakdown_df['kind'] == 'dist', ['crime_type', 'count']]
+hourly_df = breakdown_df.loc[breakdown_df['kind'] == 'hourly', ['hour', 'count']].astype({'hour': int}).sort_values('hour')
 
 # UI ENHANCEMENT: Use a container with a border for better visual grouping
 with st.container(border=True):
     col3, col4 = st.columns(2)
     with col3:
-        crime_dist_query = f'SELECT crime_type, COUNT(*) as count FROM crimes WHERE location IS NOT NULL {sql_point_region_filter} GROUP BY crime_type;'
-        crime_dist_df = load_data(crime_dist_query)
         if not crime_dist_df.empty:
             # UI ENHANCEMENT: Use theme="streamlit" to match dark/light mode
             fig1 = px.bar(crime_dist_df.sort_values('count', ascending=False).head(10), 
@@ -158,11 +266,9 @@ with st.container(border=True):
             st.info("No data for Crime Distribution.")
 
     with col4:
-        hourly_query = f"SELECT EXTRACT(HOUR FROM timestamp) as hour, COUNT(*) as count FROM crimes WHERE location IS NOT NULL {sql_point_region_filter} GROUP BY hour ORDER BY hour;"
-        hourly_df = load_data(hourly_query)
         if not hourly_df.empty:
             fig2 = px.line(hourly_df, x='hour', y='count', title=f"Hourly Crime Peaks",
-                           labels={'hour': 'Hour of Day (24H)', 'count': 'Number of Crimes'}, markers=True, template="streamlit")
+                           labels={'hour': 'Hour of Day (24H, IST)', 'count': 'Number of Crimes'}, markers=True, template="streamlit")
             st.plotly_chart(fig2, use_container_width=True)
         else:
             st.info("No data for Hourly Trends.")
\ No newline at end of file
@@ -5,7 +5,8 @@ import psycopg2.extras
 from faker import Faker
 import random
 import json
-from datetime import timezone
+import numpy as np
+import pandas as pd
 
 # --- CONFIGURATION ---
 DB_NAME = "crime_analytics"
@@ -15,6 +16,7 @@ DB_HOST = "localhost"
 DB_PORT = "5432"
 CRIME_COUNT = 250_000
 SUSPECT_COUNT = 5_000
+LOCAL_TZ = "Asia/Kolkata"  # Hours and weekdays are reported in Indian local time
 
 # --- Database Connection ---
 try:
@@ -33,6 +35,28 @@ try:
     cur.execute("TRUNCATE TABLE crimes, suspects, reports, crime_suspects, predictive_risks RESTART IDENTITY CASCADE;")
     conn.commit()
 
+    # Hour and ISO weekday are stored once at insert time, so the trainer and the dashboard
+    # read plain smallint columns instead of running EXTRACT on every row of every query.
+    # Generated columns need an immutable expression: on a timestamptz that means pinning the zone
+    # with AT TIME ZONE (EXTRACT alone follows the session TimeZone); a plain timestamp is used as stored.
+    print("🔧 Checking generated hour_of_day and dow columns in 'crimes' table...")
+    cur.execute("""
+        SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'crimes' AND column_name = 'timestamp';
+    """)
+    if cur.fetchone()[0] == 'timestamp with time zone':
+        local_timestamp = f"timestamp AT TIME ZONE '{LOCAL_TZ}'"
+    else:
+        local_timestamp = "timestamp"
+    cur.execute(f"""
+        ALTER TABLE crimes
+            ADD COLUMN IF NOT EXISTS hour_of_day smallint
+                GENERATED ALWAYS AS (EXTRACT(HOUR FROM {local_timestamp})::smallint) STORED,
+            ADD COLUMN IF NOT EXISTS dow smallint
+                GENERATED ALWAYS AS (EXTRACT(ISODOW FROM {local_timestamp})::smallint) STORED;
+    """)
+    conn.commit()
+
     # --- 2. Fetch the REAL Zones from the Database ---
     print("🗺️  Fetching real zones from the database...")
     cur.execute("SELECT zone_id, type FROM zones")
@@ -90,47 +114,91 @@ try:
         }
     }
 
-    # --- 5. Generate Crimes (without location first) ---
+    # --- 5. Generate Crimes ---
     print(f"🚨 Generating {CRIME_COUNT} crimes across all districts...")
     # THE FIX: The redundant, simple pattern_map has been REMOVED from here.
-    crimes_to_insert = []
-    for i in range(CRIME_COUNT):
-        zone_id, zone_type = random.choice(zones_db)
-        if zone_type not in pattern_map: zone_type = 'Urban'
-        crime_type = random.choices(list(pattern_map[zone_type].keys()), weights=list(pattern_map[zone_type].values()), k=1)[0]
-        timestamp = fake.date_time_between(start_date='-2y', end_date='now', tzinfo=timezone.utc)
-        crimes_to_insert.append((crime_type, f'Case of {crime_type}', timestamp, zone_id))
+    # All crimes are drawn in a few vectorised NumPy calls rather than one Python/Faker call per crime.
+    rng = np.random.default_rng()
+    zone_ids = np.array([zone_id for zone_id, _ in zones_db])
+    zone_types = np.array([zone_type if zone_type in pattern_map else 'Urban' for _, zone_type in zones_db])
+    picks = rng.integers(0, len(zones_db), size=CRIME_COUNT)
+    crime_zone_ids = zone_ids[picks]
+    crime_zone_types = zone_types[picks]
+
+    # Sample crime types per zone type, using that type's weights.
+    crime_types = np.empty(CRIME_COUNT, dtype=object)
+    for zone_type, pattern in pattern_map.items():
+        mask = crime_zone_types == zone_type
+        weights = np.array(list(pattern.values()))
+        crime_types[mask] = rng.choice(list(pattern.keys()), size=mask.sum(), p=weights / weights.sum())
+    crime_types = crime_types.astype(str)
+    descriptions = np.char.add('Case of ', crime_types)
+
+    # Uniform timestamps (whole seconds, UTC) over the last two years.
+    end_time = pd.Timestamp.now(tz='UTC')
+    start_time = end_time - pd.DateOffset(years=2)
+    timestamps = pd.to_datetime(rng.integers(int(start_time.timestamp()), int(end_time.timestamp()), size=CRIME_COUNT), unit='s', utc=True)
+
+    crimes_to_insert = list(zip(crime_types.tolist(), descriptions.tolist(), timestamps.to_pydatetime().tolist(), crime_zone_ids.tolist()))
 
     # --- 6. Bulk Insert Logic ---
-    print("   -> Temporarily relaxing database constraints for bulk insert...")
-    cur.execute("ALTER TABLE crimes ALTER COLUMN location DROP NOT NULL;")
+    # Indexes are dropped for the load and rebuilt in the finally block below: one sorted build is much
+    # cheaper than maintaining them row by row during 250k inserts.
+    print("   -> Dropping crime indexes for the bulk load...")
+    cur.execute("DROP INDEX IF EXISTS ix_crimes_zone;")
+    cur.execute("DROP INDEX IF EXISTS ix_crimes_ts;")
+    cur.execute("DROP INDEX IF EXISTS ix_crimes_loc_gist;")
+    cur.execute("DROP INDEX IF EXISTS ix_crimes_hour;")
+    cur.execute("DROP INDEX IF EXISTS ix_crimes_zone_dow_hour;")
     conn.commit()
 
     print("   -> Inserting crime records (this may take a while)...")
-    sql_insert_query = "INSERT INTO crimes (crime_type, description, timestamp, zone_id) VALUES (%s, %s, %s, %s)"
-    cur.executemany(sql_insert_query, crimes_to_insert)
+    # execute_values sends multi-row INSERTs; executemany would issue one statement per crime.
+    # Each crime is placed on its zone's precomputed rep_point (see load_real_zones.py).
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO crimes (crime_type, description, timestamp, zone_id, location)
+        SELECT v.crime_type, v.description, v.timestamp, v.zone_id, z.rep_point
+        FROM (VALUES %s) AS v (crime_type, description, timestamp, zone_id)
+        JOIN zones z ON z.zone_id = v.zone_id
+        """,
+        crimes_to_insert,
+        page_size=5000
+    )
     conn.commit()
+    print(f"   -> Inserted {CRIME_COUNT} crimes with their locations.")
 
-    # --- 7. Set Crime Locations ---
-    print("   -> Setting random locations for crimes within their zone boundaries...")
+    # --- 7. Refresh the per-zone roll-up the dashboard reads ---
+    print("📦 Refreshing zone_crime_counts materialized view...")
     cur.execute("""
-        UPDATE crimes c SET location = (
-            SELECT ST_PointOnSurface(z.boundary) FROM zones z WHERE z.zone_id = c.zone_id
-        ) WHERE c.location IS NULL;
+        CREATE MATERIALIZED VIEW IF NOT EXISTS zone_crime_counts AS
+        SELECT zone_id, crime_type, COUNT(*) AS cnt FROM crimes GROUP BY zone_id, crime_type;
     """)
+    # CONCURRENTLY needs a unique index; it keeps the view readable while the dashboard is running.
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_zone_crime_counts_key ON zone_crime_counts (zone_id, crime_type);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_zone_crime_counts_type ON zone_crime_counts (crime_type);")
+    cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY zone_crime_counts;")
     conn.commit()
-    print(f"   -> All {CRIME_COUNT} crime locations have been set.")
 
 except Exception as e:
     print(f"❌ An error occurred during data generation: {e}")
     conn.rollback()
 
 finally:
-    # --- 8. ALWAYS re-enforce the constraint ---
-    print("   -> Re-enforcing database constraints...")
-    cur.execute("ALTER TABLE crimes ALTER COLUMN location SET NOT NULL;")
-    conn.commit()
-    print("   -> Database constraints restored.")
+    # --- 8. ALWAYS rebuild the crime indexes, even if the load failed ---
+    print("   -> Rebuilding crime indexes...")
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    conn.autocommit = True
+    cur.execute("SET maintenance_work_mem = '1GB';")
+    cur.execute("SET max_parallel_maintenance_workers = 4;")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crimes_zone ON crimes (zone_id);")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crimes_ts ON crimes (timestamp);")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crimes_loc_gist ON crimes USING gist (location);")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crimes_hour ON crimes (hour_of_day);")
+    cur.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crimes_zone_dow_hour ON crimes (zone_id, dow, hour_of_day);")
+    conn.autocommit = False
+    print("   -> Crime indexes restored.")
 
     # --- 9. Clean up connection ---
     if conn:
@@ -1,8 +1,10 @@
 # Filename: load_real_zones.py (CORRECTED CRS TYPO)
 
 import psycopg2
-import psycopg2.extras
 import geopandas as gpd
+import pandas as pd
+import shapely
+import io
 
 # --- CONFIGURATION ---
 DB_NAME = "crime_analytics"
@@ -25,17 +27,55 @@ try:
     conn.commit()
 
     # --- 2. Alter column type to handle MultiPolygons ---
+    # Skipped once boundary is already geometry(Geometry, 4326): the generated columns below depend on it,
+    # so Postgres refuses to alter its type from the second run on.
+    print("🔧 Checking boundary column type in 'zones' table...")
+    cur.execute("""
+        SELECT type, srid FROM geometry_columns
+        WHERE f_table_name = 'zones' AND f_geometry_column = 'boundary';
+    """)
+    if cur.fetchone() == ('GEOMETRY', 4326):
+        print("   -> Column 'boundary' already has the flexible GEOMETRY type.")
+    else:
+        try:
+            alter_query = "ALTER TABLE zones ALTER COLUMN boundary TYPE geometry(Geometry, 4326);"
+            cur.execute(alter_query)
+            conn.commit()
+            print("   -> Column 'boundary' is now set to a flexible GEOMETRY type.")
+        except Exception as e:
+            conn.rollback()
+            print(f"   -> Could not alter the boundary column type. Error: {e}")
+
+    # --- 3. Store derived geometries per zone ---
+    # Crimes are placed on rep_point, so PostGIS computes it once per zone instead of once per crime.
+    # boundary_simplified (~1 km tolerance) is what the dashboard draws: sub-pixel detail at country zoom
+    # would only bloat the GeoJSON sent to the browser.
+    # Each column is committed on its own so a failure on one never rolls back the other.
+    try:
+        print("🔧 Checking generated rep_point column in 'zones' table...")
+        cur.execute("""
+            ALTER TABLE zones ADD COLUMN IF NOT EXISTS rep_point geometry(Point, 4326)
+            GENERATED ALWAYS AS (ST_PointOnSurface(boundary)) STORED;
+        """)
+        conn.commit()
+        print("   -> Column 'rep_point' is in place.")
+    except Exception as e:
+        conn.rollback()
+        print(f"   -> Could not add the rep_point column. Error: {e}")
+
     try:
-        print("🔧 Checking and updating boundary column type in 'zones' table...")
-        alter_query = "ALTER TABLE zones ALTER COLUMN boundary TYPE geometry(Geometry, 4326);"
-        cur.execute(alter_query)
+        print("🔧 Checking generated boundary_simplified column in 'zones' table...")
+        cur.execute("""
+            ALTER TABLE zones ADD COLUMN IF NOT EXISTS boundary_simplified geometry(Geometry, 4326)
+            GENERATED ALWAYS AS (ST_SimplifyPreserveTopology(boundary, 0.01)) STORED;
+        """)
         conn.commit()
-        print("   -> Column 'boundary' is now set to a flexible GEOMETRY type.")
+        print("   -> Column 'boundary_simplified' is in place.")
     except Exception as e:
         conn.rollback()
-        print(f"   -> Could not alter table, it might be the correct type already. Error: {e}")
+        print(f"   -> Could not add the boundary_simplified column. Error: {e}")
 
-    # --- 3. Load the Real District Data from Shapefile ---
+    # --- 4. Load the Real District Data from Shapefile ---
     print(f"🗺️  Loading real district boundaries from {SHAPEFILE_PATH}...")
     try:
         gdf = gpd.read_file(SHAPEFILE_PATH)
@@ -46,37 +86,40 @@ try:
         print(f"❌ Could not read shapefile. Check path and related files (.shx, .dbf). Error: {e}")
         exit()
 
-    # --- 4. Clean the data by merging duplicate district names ---
+    # --- 5. Clean the data by merging duplicate district names ---
     print("✨ Cleaning data: Merging geometries for duplicate district names...")
     original_count = len(gdf)
     gdf = gdf.dissolve(by=['NAME_1', 'NAME_2']).reset_index()
     merged_count = len(gdf)
     print(f"   -> Merged {original_count - merged_count} duplicate entries. Final district count: {merged_count}.")
 
-    # --- 5. Prepare and Insert Data into the Database ---
-    zones_to_insert = []
-    for index, row in gdf.iterrows():
-        district_name = row['NAME_2']
-        state_name = row['NAME_1']
-        full_name = f"{district_name}, {state_name}"
-        geometry_wkt = row['geometry'].wkt
-        zone_type = "Urban"
-        zones_to_insert.append((full_name, zone_type, f"SRID=4326;{geometry_wkt}"))
+    # --- 6. Prepare and Insert Data into the Database ---
+    # Rows are streamed through COPY with geometries as hex EWKB, which PostGIS decodes without parsing WKT.
+    # Names and geometries are built column-wise instead of row by row.
+    zones_df = pd.DataFrame({
+        'name': gdf['NAME_2'] + ", " + gdf['NAME_1'],
+        'type': "Urban",
+        'boundary': shapely.to_wkb(shapely.set_srid(gdf.geometry.to_numpy(), 4326), hex=True, include_srid=True),
+    })
+    zones_csv = io.StringIO()
+    zones_df.to_csv(zones_csv, index=False, header=False)
+    zones_csv.seek(0)
 
     print("   -> Inserting new zones into the database (this might take a moment)...")
-    psycopg2.extras.execute_values(
-        cur,
-        "INSERT INTO zones (name, type, boundary) VALUES %s",
-        zones_to_insert
-    )
+    cur.copy_expert("COPY zones (name, type, boundary) FROM STDIN WITH (FORMAT csv)", zones_csv)
+    conn.commit()
+    print(f"✅ Successfully inserted {len(gdf)} real zones.")
+
+    # --- 7. Spatial index for the dashboard's region filter ---
+    print("   -> Ensuring GIST index on zone boundaries...")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_zones_boundary_gist ON zones USING gist (boundary);")
     conn.commit()
-    print(f"✅ Successfully inserted {len(zones_to_insert)} real zones.")
 
 except Exception as e:
     print(f"❌ An error occurred: {e}")
 
 finally:
-    # --- 6. Clean up ---
+    # --- 8. Clean up ---
     if 'conn' in locals() and conn is not None:
         cur.close()
         conn.close()